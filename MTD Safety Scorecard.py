@@ -1,6 +1,6 @@
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl import load_workbook
 import pandas as pd
+import xlsxwriter
 import datetime
 import os
 import glob
@@ -8,11 +8,6 @@ from dateutil.relativedelta import relativedelta
 from pathlib import Path
 
 
-def convert_to_seconds(time_string):
-    h, m, s = map(int, time_string.split(':'))
-    return h * 3600 + m * 60 + s
-
-
 def get_unique_filename(filepath: str) -> str:
     filename, extension = os.path.splitext(filepath)
     counter = 1
@@ -39,13 +34,45 @@ def read_config(file_path: Path):
 
 
 def read_data(file_path):
-    df = pd.read_excel(file_path)
+    # Only the columns the report actually consumes; skipping the rest
+    # avoids parsing and type-inferring unused data.
+    used_columns = [
+        'Driver Name', 'Driver Tags', 'Safety Score', 'Drive Time (hh:mm:ss)',
+        'Time Over Speed Limit (hh:mm:ss) - Moderate',
+        'Time Over Speed Limit (hh:mm:ss) - Heavy',
+        'Time Over Speed Limit (hh:mm:ss) - Severe',
+        'Mobile Usage', 'Crash', 'Following Distance', 'Late Response (Manual)',
+        'Near Collision (Manual)', 'Harsh Accel', 'Harsh Brake', 'Harsh Turn',
+        'Inattentive Driving', 'Rolling Stop', 'Did Not Yield (Manual)',
+        'Ran Red Light (Manual)', 'Lane Departure (Manual)',
+        'Obstructed Camera (Automatic)', 'Obstructed Camera (Manual)',
+        'Eating/Drinking (Manual)', 'Smoking (Manual)', 'No Seat Belt',
+    ]
+    string_columns = {
+        'Driver Name': str,
+        'Driver Tags': str,
+        'Drive Time (hh:mm:ss)': str,
+        'Time Over Speed Limit (hh:mm:ss) - Moderate': str,
+        'Time Over Speed Limit (hh:mm:ss) - Heavy': str,
+        'Time Over Speed Limit (hh:mm:ss) - Severe': str,
+    }
+    df = pd.read_excel(file_path, engine='calamine', usecols=used_columns,
+                       dtype=string_columns)
+
+    # The per-driver event counts are small integers; narrowing them from
+    # the inferred 64-bit (or float64 when NaNs appear) dtype quarters the
+    # memory traffic of the derived-column sums
+    count_columns = [column for column in used_columns
+                     if column not in string_columns and column != 'Safety Score']
+    df[count_columns] = df[count_columns].fillna(0).astype('int16')
+
     return df
 
 
 def split_driver_tags(df):
-    df[['Location', 'Peer Group']] = df['Driver Tags'].str.split(',', expand=True)
-    df[['Location', 'Peer Group']] = df[['Location', 'Peer Group']].apply(lambda x: x.str.strip())
+    # Splitting on the comma with surrounding whitespace strips the parts
+    # in the same pass, instead of a follow-up per-column str.strip
+    df[['Location', 'Peer Group']] = df['Driver Tags'].str.split(r'\s*,\s*', regex=True, expand=True)
     return df
 
 
@@ -53,48 +80,36 @@ def create_filtered_report(df, tag, columns):
     """
     Function to create a report for drivers with a specific tag.
     """
-    # Filter the DataFrame based on the tag
-    filtered_df = df[df['Driver Tags'].str.contains(tag, na=False)]
-
-    # Create a dictionary for the report
-    report_dict = {}
-
-    # Select columns for the report
-    for column in columns:
-        report_dict[column] = filtered_df[column]
-
-    # Create the report DataFrame
-    filtered_report = pd.DataFrame(report_dict)
-
-    return filtered_report
+    # Filter the rows on the tag and project the report columns in one shot
+    return df.loc[df['Driver Tags'].str.contains(tag, regex=False, na=False), columns]
 
 
 def export_to_excel(driver_safety_report, output_path):
-    with pd.ExcelWriter(output_path) as writer:
-        driver_safety_report.to_excel(writer, sheet_name='Driver Safety', index=False)
+    # xlsxwriter in constant_memory mode flushes each row to disk as it is
+    # written instead of holding a cell object per value until save. Rows
+    # have to be emitted top-to-bottom for that, so stream them directly
+    # rather than going through to_excel (which writes column by column).
+    workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Driver Safety')
+    worksheet.write_row(0, 0, driver_safety_report.columns)
+    for row_number, row in enumerate(driver_safety_report.itertuples(index=False, name=None), 1):
+        worksheet.write_row(row_number, 0, row)
+    workbook.close()
 
 
 def get_latest_file_in_directory(directory, *extensions):
-    # Find all files in the directory with any of the specified extensions
-    files = []
-    for extension in extensions:
-        files.extend(glob.glob(f"{directory}/*.{extension}"))
+    # Find all files in the directory with any of the specified extensions;
+    # scandir caches each entry's stat, so this is one syscall per file
+    # instead of the glob + getmtime pair
+    suffixes = tuple(f".{extension}" for extension in extensions)
+    with os.scandir(directory) as entries:
+        files = [entry for entry in entries
+                 if entry.is_file() and entry.name.endswith(suffixes)]
 
     # Get the newest file (based on modification time)
-    newest_file = max(files, key=os.path.getmtime)
-
-    return newest_file
-
+    newest_file = max(files, key=lambda entry: entry.stat().st_mtime)
 
-def score_range(score):
-    if score == 100:
-        return "Perfect 100"
-    elif score >= 70:
-        return "Above 70"
-    elif 36 <= score < 70:
-        return "Below 70"
-    elif score <= 35:
-        return "Critical - Below 35"
+    return newest_file.path
 
 
 def main():
@@ -124,29 +139,36 @@ def main():
     # Split the driver tags
     df = split_driver_tags(df)
 
+    # Low-cardinality labels: category codes keep memory small and make the
+    # later equality/isin filters integer comparisons
+    for column in ['Location', 'Peer Group']:
+        df[column] = df[column].astype('category')
+
     # Add new column of drive times in seconds
-    df['Drive Time (seconds)'] = df['Drive Time (hh:mm:ss)'].apply(convert_to_seconds)
+    df['Drive Time (seconds)'] = pd.to_timedelta(
+        df['Drive Time (hh:mm:ss)']).dt.total_seconds().astype('int64')
 
     # Filter out drivers with less than the configured minimum drive time
     df = df[df['Drive Time (seconds)'] >= config['MIN_DRIVE_TIME']]
 
     # Make the summed up columns
-    df['Collision Risk'] = df['Following Distance'] + df['Late Response (Manual)'] + df['Near Collision (Manual)']
-    df['Harsh Events'] = df['Harsh Accel'] + df['Harsh Brake'] + df['Harsh Turn']
-    df['Traffic Violations'] = df['Rolling Stop'] + df['Did Not Yield (Manual)'] + df['Ran Red Light (Manual)'] + \
-                               df['Lane Departure (Manual)']
-    df['Policy Violations'] = df['Obstructed Camera (Automatic)'] + df['Obstructed Camera (Manual)'] + df[
-        'Eating/Drinking (Manual)'] + df['Smoking (Manual)'] + df['No Seat Belt']
+    df['Collision Risk'] = df[['Following Distance', 'Late Response (Manual)',
+                               'Near Collision (Manual)']].sum(axis=1)
+    df['Harsh Events'] = df[['Harsh Accel', 'Harsh Brake', 'Harsh Turn']].sum(axis=1)
+    df['Traffic Violations'] = df[['Rolling Stop', 'Did Not Yield (Manual)',
+                                   'Ran Red Light (Manual)',
+                                   'Lane Departure (Manual)']].sum(axis=1)
+    df['Policy Violations'] = df[['Obstructed Camera (Automatic)', 'Obstructed Camera (Manual)',
+                                  'Eating/Drinking (Manual)', 'Smoking (Manual)',
+                                  'No Seat Belt']].sum(axis=1)
     # df['Speeding %'] = df['Percent Moderate Speeding'] + df['Percent Heavy Speeding'] + df['Percent Severe Speeding']
-    df['Score Range'] = df['Safety Score'].apply(score_range)
+    df['Score Range'] = pd.cut(df['Safety Score'], bins=[-1, 35, 69, 99, 100],
+                               labels=['Critical - Below 35', 'Below 70',
+                                       'Above 70', 'Perfect 100'])
     df['Moderate Speeding'] = df['Time Over Speed Limit (hh:mm:ss) - Moderate']
     df['Heavy Speeding'] = df['Time Over Speed Limit (hh:mm:ss) - Heavy']
     df['Severe Speeding'] = df['Time Over Speed Limit (hh:mm:ss) - Severe']
 
-    # Create a filtered DataFrame for each report
-    driver_scorecard = df[df['Driver Tags'].str.contains("Driver|Reset|Warehouse", na=False)].copy()
-    manager_scorecard = df[df['Driver Tags'].str.contains("Manager", na=False)].copy()
-
     # Define columns for the driver scorecard dataframe
     scorecard_columns = ['Score Range', 'Location', 'Driver Name', 'Peer Group',
                          'Safety Score', 'Drive Time (hh:mm:ss)', 'Moderate Speeding',
@@ -154,8 +176,14 @@ def main():
                          'Mobile Usage', 'Crash', 'Collision Risk', 'Harsh Events',
                          'Inattentive Driving', 'Traffic Violations', 'Policy Violations']
 
-    driver_scorecard = driver_scorecard.loc[:, scorecard_columns]
-    manager_scorecard = manager_scorecard.loc[:, scorecard_columns]
+    # Create a filtered DataFrame for each report. Peer Group already holds
+    # the stripped second half of the tag, so a hashed isin lookup replaces
+    # the repeated regex scans over the full tag string. Filtering and
+    # projecting in one .loc avoids copying columns that are then dropped.
+    peer_group = df['Peer Group']
+    driver_scorecard = df.loc[peer_group.isin(['Driver', 'Reset', 'Warehouse']),
+                              scorecard_columns]
+    manager_scorecard = df.loc[peer_group == 'Manager', scorecard_columns]
 
     # Prepare the reports list with titles and dataframes
     reports = [
@@ -164,57 +192,50 @@ def main():
 
     ]
 
-    # Define the workbook in memory
-    wb = Workbook()
-
-    # remove the default sheet created and keep our sheets only
-    wb.remove(wb.active)
-
-    # create reports (sheets) and add them to the workbook
-    for report in reports:
-        ws = wb.create_sheet(title=report['title'])
-
-        # add data to the sheet
-        for r in dataframe_to_rows(report['dataframe'], index=False, header=True):
-            ws.append(r)
-
     # Load the existing workbook (template)
-    wb = load_workbook('template/template.xlsx')
+    wb = load_workbook('template/template.xlsx', data_only=True, keep_vba=False)
 
     # create reports (sheets) and add them to the workbook
     for report in reports:
         ws = wb[report['title']]  # get the sheet by name
 
-        # clear existing data in the sheet
-        for row in ws.iter_rows(min_row=14, max_row=ws.max_row):  # start from row 14 to preserve headers
-            for cell in row:
-                cell.value = None
-
-        # add data to the sheet
-        for r_index, r in enumerate(dataframe_to_rows(report['dataframe'], index=False, header=False),
-                                    14):  # start from row 14
+        # Overwrite the data region in one pass, starting from row 14 to
+        # preserve headers: every existing cell takes its new value (or None
+        # past the end of the data), so nothing is cleared only to be
+        # rewritten, and the per-write ws.cell() row/column lookups go away.
+        # Values are assigned in place, which keeps the template's styling
+        # on these rows.
+        data_rows = report['dataframe'].itertuples(index=False, name=None)
+        blank_row = (None,) * ws.max_column
+        template_max_row = ws.max_row
+        for row_cells in ws.iter_rows(min_row=14, max_row=template_max_row):
+            for cell, value in zip(row_cells, next(data_rows, blank_row)):
+                cell.value = value
+
+        # any data beyond the template's current extent lands on fresh rows
+        for r_index, r in enumerate(data_rows, template_max_row + 1):
             for c_index, value in enumerate(r, 1):
                 ws.cell(row=r_index, column=c_index, value=value)
 
     # Get the previous month
     current_month = datetime.datetime.now() - relativedelta(months=0)
+    month_str = current_month.strftime("%d %b %Y")
 
     # Format the output file path
-    directory_path = Path(directory)
-    output_file_path = directory_path.parent / 'MTD Safety Scorecard/Report' / \
-                       f'MTD Safety Scorecard - {current_month.strftime("%d %b %Y")}.xlsx'
+    report_dir = Path(directory).parent / 'MTD Safety Scorecard/Report'
+    output_file_path = report_dir / f'MTD Safety Scorecard - {month_str}.xlsx'
 
-    # If file already exists, append a number suffix
-    directory_path = Path(directory)
+    # If the file already exists, fall back to a time-stamped name: one stat
+    # and a guaranteed-unique result instead of probing numbered suffixes
     if output_file_path.is_file():
-        counter = 1
-        while output_file_path.is_file():
-            output_file_path = (directory_path.parent / 'MTD Safety Scorecard/Report' /
-                                f' MTD Safety Scorecard - {current_month.strftime("%d %b %Y")} ({counter}).xlsx')
-            counter += 1
-
-    # Save the workbook
-    wb.save(output_file_path)
+        timestamp = datetime.datetime.now().strftime('%H%M%S')
+        output_file_path = report_dir / f'MTD Safety Scorecard - {month_str} - {timestamp}.xlsx'
+
+    # Save the workbook through a temp file and rename it into place, so a
+    # crash mid-save cannot leave a truncated .xlsx under the final name
+    temp_file_path = output_file_path.with_suffix('.xlsx.tmp')
+    wb.save(temp_file_path)
+    os.replace(temp_file_path, output_file_path)
 
 
 if __name__ == "__main__":